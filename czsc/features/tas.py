@@ -44,7 +44,7 @@ def CCF(df, **kwargs):
 
     bars = format_standard_kline(df, freq=freq)
     dfs = generate_czsc_signals(bars, signals_config, init_n=300, sdt=bars[0].dt, df=True)
-    dfs[factor_col] = dfs.apply(czsc_factor.is_match, axis=1).astype(int)
+    dfs[factor_col] = czsc_factor.is_match_batch(dfs).astype(int)
 
     df = pd.merge(df, dfs[['dt', factor_col]], on='dt', how='left')
     df[factor_col] = df[factor_col].fillna(0)
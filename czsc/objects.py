@@ -5,11 +5,14 @@ email: zeng_bin8888@163.com
 create_dt: 2021/3/10 12:21
 describe: 常用对象结构
 """
+import sys
 import math
 import hashlib
+import numpy as np
 import pandas as pd
 from copy import deepcopy
 from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime
 from loguru import logger
 from deprecated import deprecated
@@ -18,6 +21,22 @@ from czsc.enum import Mark, Direction, Freq, Operate
 from czsc.utils.corr import single_linear
 
 
+# Python 3.10+ 的 dataclass 支持 slots=True，去除实例 __dict__，降低大量创建对象时的内存占用
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+def _slots_setstate(self, state):
+    """slots dataclass 的反序列化，兼容旧版本 pickle/dill 保存的 __dict__ 状态
+
+    slots 对象的状态为 (None, slots 字典)，旧版本对象的状态为 __dict__ 字典
+    """
+    if isinstance(state, tuple):
+        dict_state, slots_state = state
+        state = {**(dict_state or {}), **(slots_state or {})}
+    for k, v in state.items():
+        object.__setattr__(self, k, v)
+
+
 @deprecated(version="1.0.0", reason="请使用 RawBar")
 @dataclass
 class Tick:
@@ -59,7 +78,7 @@ class RawBar:
         return abs(self.open - self.close)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class NewBar:
     """去除包含关系后的K线元素"""
 
@@ -76,12 +95,14 @@ class NewBar:
     elements: List = field(default_factory=list)  # 存入具有包含关系的原始K线
     cache: dict = field(default_factory=dict)  # cache 用户缓存
 
+    __setstate__ = _slots_setstate
+
     @property
     def raw_bars(self):
         return self.elements
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class FX:
     symbol: str
     dt: datetime
@@ -92,6 +113,8 @@ class FX:
     elements: List = field(default_factory=list)
     cache: dict = field(default_factory=dict)  # cache 用户缓存
 
+    __setstate__ = _slots_setstate
+
     @property
     def new_bars(self):
         """构成分型的无包含关系K线"""
@@ -142,7 +165,7 @@ class FX:
         return zg >= zd
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class FakeBI:
     """虚拟笔：主要为笔的内部分析提供便利"""
 
@@ -155,6 +178,8 @@ class FakeBI:
     power: float
     cache: dict = field(default_factory=dict)  # cache 用户缓存
 
+    __setstate__ = _slots_setstate
+
 
 def create_fake_bis(fxs: List[FX]) -> List[FakeBI]:
     """创建 fake_bis 列表
@@ -440,24 +465,42 @@ class Signal:
                 self.v1,
                 self.v2,
                 self.v3,
-                score,
-            ) = self.signal.split("_")
-            self.score = int(score)
+                self.score,
+            ) = Signal._parse(self.signal)
 
         if self.score > 100 or self.score < 0:
             raise ValueError("score 必须在0~100之间")
 
+        self._init_match_attrs()
+
+    def _init_match_attrs(self):
+        """预先计算 is_match 需要的信号名称、信号取值及其是否为 任意，避免每次匹配时重复计算"""
+        self._key = "_".join(k for k in (self.k1, self.k2, self.k3) if k != "任意")
+        self._pattern = (self.v1, self.v2, self.v3)
+        self._wild = tuple(v == "任意" for v in self._pattern)
+
+    def __setstate__(self, state):
+        # 兼容旧版本 pickle/dill 保存的 Signal 对象，其中没有预先计算的匹配属性
+        self.__dict__.update(state)
+        self._init_match_attrs()
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def _parse(signal: str) -> tuple:
+        """解析信号字符串，返回 (k1, k2, k3, v1, v2, v3, score)
+
+        信号字符串的取值有限且会被反复解析，使用 lru_cache 缓存解析结果
+        """
+        k1, k2, k3, v1, v2, v3, score = signal.split("_")
+        return k1, k2, k3, v1, v2, v3, int(score)
+
     def __repr__(self):
         return f"Signal('{self.signal}')"
 
     @property
     def key(self) -> str:
         """获取信号名称"""
-        key = ""
-        for k in [self.k1, self.k2, self.k3]:
-            if k != "任意":
-                key += k + "_"
-        return key.strip("_")
+        return self._key
 
     @property
     def value(self) -> str:
@@ -480,18 +523,66 @@ class Signal:
         :param s: 所有信号字典
         :return: bool
         """
-        key = self.key
+        key = self._key
         v = s.get(key, None)
         if not v:
             raise ValueError(f"{key} 不在信号列表中")
 
         v1, v2, v3, score = v.split("_")
-        if int(score) >= self.score:
-            if v1 == self.v1 or self.v1 == "任意":
-                if v2 == self.v2 or self.v2 == "任意":
-                    if v3 == self.v3 or self.v3 == "任意":
-                        return True
-        return False
+        if int(score) < self.score:
+            return False
+
+        p1, p2, p3 = self._pattern
+        w1, w2, w3 = self._wild
+        return (w1 or v1 == p1) and (w2 or v2 == p2) and (w3 or v3 == p3)
+
+    def is_match_batch(self, df: pd.DataFrame, cache: dict = None) -> np.ndarray:
+        """批量判断信号是否与 df 中每一行的信号值匹配，结果与逐行调用 is_match 一致
+
+        :param df: 信号 DataFrame，每一行是一个信号字典，列名为信号名称，如 generate_czsc_signals(..., df=True) 的结果
+        :param cache: 信号列拆分结果缓存，同一个 df 上的多个信号共用，避免重复拆分
+        :return: bool 数组，长度与 df 一致
+        """
+        v1, v2, v3, score = _split_signal_values(df, self._key, {} if cache is None else cache)
+        mask = score >= self.score
+        for v, p, w in zip((v1, v2, v3), self._pattern, self._wild):
+            if not w:
+                mask &= v == p
+        return mask
+
+
+def _split_signal_values(df: pd.DataFrame, key: str, cache: dict) -> tuple:
+    """将 df 中名称为 key 的信号列拆分为 (v1, v2, v3, score) 四个数组，拆分结果存入 cache"""
+    parts = cache.get(key)
+    if parts is None:
+        if key not in df.columns:
+            raise ValueError(f"{key} 不在信号列表中")
+
+        values = df[key]
+        if values.empty:
+            empty = np.array([], dtype=object)
+            cache[key] = (empty, empty, empty, np.array([], dtype=int))
+            return cache[key]
+
+        if values.isna().any() or (values == "").any():
+            raise ValueError(f"{key} 不在信号列表中")
+
+        sp = values.str.split("_", expand=True)
+        if sp.shape[1] != 4 or sp[3].isna().any():
+            raise ValueError(f"{key} 的信号值格式错误")
+
+        parts = (sp[0].to_numpy(), sp[1].to_numpy(), sp[2].to_numpy(), sp[3].astype(int).to_numpy())
+        cache[key] = parts
+    return parts
+
+
+def _cached_signal_match(signal: Signal, s: dict, cache: dict) -> bool:
+    """带缓存的 Signal.is_match，相同的 signal 字符串在同一个信号字典上只匹配一次"""
+    r = cache.get(signal.signal)
+    if r is None:
+        r = signal.is_match(s)
+        cache[signal.signal] = r
+    return r
 
 
 @dataclass
@@ -534,23 +625,55 @@ class Factor:
 
     def is_match(self, s: dict) -> bool:
         """判断 factor 是否满足"""
+        return self._is_match_cached(s, {})
+
+    def _is_match_cached(self, s: dict, cache: dict) -> bool:
+        """判断 factor 是否满足
+
+        :param s: 所有信号字典
+        :param cache: 信号匹配结果缓存，key 为 signal 字符串；同一个 s 上的多个 Factor 共用，避免重复匹配
+        :return: bool
+        """
         if self.signals_not:
             for signal in self.signals_not:
-                if signal.is_match(s):
+                if _cached_signal_match(signal, s, cache):
                     return False
 
         for signal in self.signals_all:
-            if not signal.is_match(s):
+            if not _cached_signal_match(signal, s, cache):
                 return False
 
         if not self.signals_any:
             return True
 
         for signal in self.signals_any:
-            if signal.is_match(s):
+            if _cached_signal_match(signal, s, cache):
                 return True
         return False
 
+    def is_match_batch(self, df: pd.DataFrame, cache: dict = None) -> np.ndarray:
+        """批量判断 factor 是否满足，结果与逐行调用 is_match 一致
+
+        :param df: 信号 DataFrame，每一行是一个信号字典
+        :param cache: 信号列拆分结果缓存，参见 Signal.is_match_batch
+        :return: bool 数组，长度与 df 一致
+        """
+        cache = {} if cache is None else cache
+        mask = np.ones(len(df), dtype=bool)
+        for signal in self.signals_all:
+            mask &= signal.is_match_batch(df, cache)
+
+        if self.signals_any:
+            any_mask = np.zeros(len(df), dtype=bool)
+            for signal in self.signals_any:
+                any_mask |= signal.is_match_batch(df, cache)
+            mask &= any_mask
+
+        if self.signals_not:
+            for signal in self.signals_not:
+                mask &= ~signal.is_match_batch(df, cache)
+        return mask
+
     def dump(self) -> dict:
         """将 Factor 对象转存为 dict"""
         signals_all = [x.signal for x in self.signals_all]
@@ -656,21 +779,65 @@ class Event:
         4. 最后判断因子是否满足，顺序遍历因子列表，找到第一个满足的因子就退出，并返回 True 和该因子的名称，表示事件满足。
         5. 如果遍历完所有因子都没有找到满足的因子，则返回 False，表示事件不满足。
         """
-        if self.signals_not and any(signal.is_match(s) for signal in self.signals_not):
+        return self._is_match_cached(s, {})
+
+    def _is_match_cached(self, s: dict, cache: dict):
+        """判断 event 是否满足，逻辑与 is_match 一致
+
+        :param s: 所有信号字典
+        :param cache: 信号匹配结果缓存，key 为 signal 字符串；同一个 s 上的多个 Event 共用，避免重复匹配
+        :return: (是否满足, 满足的因子名称)
+        """
+        if self.signals_not and any(_cached_signal_match(x, s, cache) for x in self.signals_not):
             return False, None
 
-        if self.signals_all and not all(signal.is_match(s) for signal in self.signals_all):
+        if self.signals_all and not all(_cached_signal_match(x, s, cache) for x in self.signals_all):
             return False, None
 
-        if self.signals_any and not any(signal.is_match(s) for signal in self.signals_any):
+        if self.signals_any and not any(_cached_signal_match(x, s, cache) for x in self.signals_any):
             return False, None
 
+        # 多个因子中往往存在相同的信号，共用 cache 避免重复匹配
         for factor in self.factors:
-            if factor.is_match(s):
+            if factor._is_match_cached(s, cache):
                 return True, factor.name
 
         return False, None
 
+    def is_match_batch(self, df: pd.DataFrame):
+        """批量判断 event 是否满足，结果与逐行调用 is_match 一致
+
+        :param df: 信号 DataFrame，每一行是一个信号字典
+        :return: (mask, factors)
+
+            - mask: bool 数组，每一行是否满足事件
+            - factors: object 数组，每一行第一个满足的因子名称，不满足的行为 None
+        """
+        cache = {}
+        mask = np.ones(len(df), dtype=bool)
+        if self.signals_not:
+            for signal in self.signals_not:
+                mask &= ~signal.is_match_batch(df, cache)
+
+        if self.signals_all:
+            for signal in self.signals_all:
+                mask &= signal.is_match_batch(df, cache)
+
+        if self.signals_any:
+            any_mask = np.zeros(len(df), dtype=bool)
+            for signal in self.signals_any:
+                any_mask |= signal.is_match_batch(df, cache)
+            mask &= any_mask
+
+        # 按顺序遍历因子，每一行记录第一个满足的因子名称
+        factors = np.full(len(df), None, dtype=object)
+        pending = mask.copy()
+        for factor in self.factors:
+            hit = pending & factor.is_match_batch(df, cache)
+            factors[hit] = factor.name
+            pending &= ~hit
+        return mask & ~pending, factors
+
     def dump(self) -> dict:
         """将 Event 对象转存为 dict"""
         signals_all = [x.signal for x in self.signals_all] if self.signals_all else []
@@ -742,6 +909,11 @@ def cal_break_even_point(seq: List[float]) -> float:
     return sub_i / len(seq)
 
 
+# Position 支持的事件操作类型，以及会触发开仓的操作类型；使用 set 代替 list，避免每次 update 的线性查找
+_POSITION_OPERATES = frozenset([Operate.LO, Operate.LE, Operate.SO, Operate.SE])
+_OPEN_OPERATES = frozenset([Operate.LO, Operate.SO])
+
+
 class Position:
     def __init__(
         self,
@@ -773,7 +945,7 @@ class Position:
         self.exits = exits if exits else []
         self.events = self.opens + self.exits
         for event in self.events:
-            assert event.operate in [Operate.LO, Operate.LE, Operate.SO, Operate.SE]
+            assert event.operate in _POSITION_OPERATES
 
         self.interval = interval
         self.timeout = timeout
@@ -888,7 +1060,7 @@ class Position:
         pairs = []
 
         for op1, op2 in zip(self.operates, self.operates[1:]):
-            if op1["op"] not in [Operate.LO, Operate.SO]:
+            if op1["op"] not in _OPEN_OPERATES:
                 continue
 
             ykr = (
@@ -1027,8 +1199,9 @@ class Position:
         self.pos_changed = False
         op = Operate.HO
         op_desc = ""
+        cache = {}  # 开平仓事件中往往存在相同的信号，共用信号匹配结果
         for event in self.events:
-            m, f = event.is_match(s)
+            m, f = event._is_match_cached(s, cache)
             if m:
                 op = event.operate
                 op_desc = f"{event.name}@{f}"
@@ -1038,7 +1211,7 @@ class Position:
         self.end_dt = dt
 
         # 当有新的开仓 event 发生，更新 last_event
-        if op in [Operate.LO, Operate.SO]:
+        if op in _OPEN_OPERATES:
             self.last_event = {
                 "dt": dt,
                 "bid": bid,
@@ -5,9 +5,12 @@ email: zeng_bin8888@163.com
 create_dt: 2021/11/14 12:39
 describe: 从任意周期K线开始合成更高周期K线的工具类
 """
+import numpy as np
 import pandas as pd
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from datetime import datetime, timedelta, date
-from typing import List, Union, AnyStr, Optional
+from typing import List, Union, AnyStr, Optional, Iterable
 from czsc.objects import RawBar, Freq
 from pathlib import Path
 from loguru import logger
@@ -16,9 +19,27 @@ from loguru import logger
 mss = pd.read_feather(Path(__file__).parent / "minites_split.feather")
 freq_market_times, freq_edt_map = {}, {}
 for _m, dfg in mss.groupby('market'):
+    # 先转成 list 再构建字典，避免逐列 unique 和二维 .values 带来的导入耗时
+    _times = dfg['time'].tolist()
     for _f in [x for x in mss.columns if x.endswith("分钟")]:
-        freq_market_times[f"{_f}_{_m}"] = list(dfg[_f].unique())
-        freq_edt_map[f"{_f}_{_m}"] = {k: v for k, v in dfg[["time", _f]].values}
+        _values = dfg[_f].tolist()
+        freq_market_times[f"{_f}_{_m}"] = list(dict.fromkeys(_values))
+        freq_edt_map[f"{_f}_{_m}"] = dict(zip(_times, _values))
+
+# freq_edt_map 的整数形式：key 为 hour * 60 + minute，value 为结束时间的 (hour, minute)，避免 strftime 和字符串解析
+_freq_edt_minutes = {
+    key: {int(k[:2]) * 60 + int(k[3:]): (int(v[:2]), int(v[3:])) for k, v in edt_map.items()}
+    for key, edt_map in freq_edt_map.items()
+}
+
+# 排序去重后的交易时间序列，用于 check_freq_and_market 中的区间查找
+_sorted_freq_market_times = {k: sorted(set(v)) for k, v in freq_market_times.items()}
+
+# 分钟级别的K线周期，freq_end_time 中使用 freq_edt_map 查找结束时间
+_MINUTE_FREQS = frozenset(f for f in Freq if f.value.endswith("分钟"))
+
+# Freq 的定义顺序即K线周期从小到大的顺序，与 czsc.utils.sorted_freqs 一致
+_SORTED_FREQ_IDX = {f.value: i for i, f in enumerate(Freq)}
 
 
 def is_trading_time(dt: datetime = datetime.now(), market="A股"):
@@ -39,6 +60,20 @@ def get_intraday_times(freq='1分钟', market="A股"):
     return freq_market_times[f"{freq}_{market}"]
 
 
+def _rawbars_from_columns(df: pd.DataFrame, freq: Freq, ids: Iterable[int]) -> List[RawBar]:
+    """按列批量创建 RawBar，避免逐行访问 DataFrame
+
+    :param df: K线数据，必须包含 symbol, dt, open, close, high, low, vol, amount 列
+    :param freq: K线周期
+    :param ids: 与 df 行一一对应的 K线 id 序列
+    :return: RawBar 列表
+    """
+    cols = [df[x].tolist() for x in ['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount']]
+    # 按 RawBar 字段顺序传入位置参数：symbol, id, dt, freq, open, close, high, low, vol, amount
+    return [RawBar(symbol, i, dt, freq, open_, close, high, low, vol, amount)
+            for i, (symbol, dt, open_, close, high, low, vol, amount) in zip(ids, zip(*cols))]
+
+
 def format_standard_kline(df: pd.DataFrame, freq: str):
     """格式化标准K线数据为 CZSC 标准数据结构 RawBar 列表
 
@@ -54,13 +89,7 @@ def format_standard_kline(df: pd.DataFrame, freq: str):
     :param freq: K线级别
     :return: list of RawBar
     """
-    # from czsc.objects import RawBar, Freq
-    bars = []
-    for i, row in df.iterrows():
-        bar = RawBar(id=i, symbol=row['symbol'], dt=row['dt'], open=row['open'], close=row['close'],
-                     high=row['high'], low=row['low'], vol=row['vol'], amount=row['amount'], freq=Freq(freq))
-        bars.append(bar)
-    return bars
+    return _rawbars_from_columns(df, Freq(freq), df.index.tolist())
 
 
 def check_freq_and_market(time_seq: List[AnyStr], freq: Optional[AnyStr] = None):
@@ -84,20 +113,25 @@ def check_freq_and_market(time_seq: List[AnyStr], freq: Optional[AnyStr] = None)
     if freq in ['日线', '周线', '月线', '季线', '年线']:
         return freq, "默认"
 
-    time_seq = sorted(list(set(time_seq)))
+    time_seq = tuple(sorted(set(time_seq)))
     assert len(time_seq) >= 2, "time_seq长度必须大于等于2"
+    return _check_freq_and_market(time_seq, freq)
 
-    for key, tts in freq_market_times.items():
+
+@lru_cache(maxsize=256)
+def _check_freq_and_market(time_seq: tuple, freq: Optional[AnyStr] = None):
+    """check_freq_and_market 的缓存实现，time_seq 必须是排序去重后的 tuple"""
+    time_seq = list(time_seq)
+    for key, tts in _sorted_freq_market_times.items():
         if freq and not key.startswith(freq):
             continue
         freq_x, market = key.split("_")
 
         if freq_x == '1分钟':
-            time_seq.extend(['14:57', '14:58', '14:59', '15:00'])
+            time_seq = sorted(set(time_seq) | {'14:57', '14:58', '14:59', '15:00'})
 
-        sub_tts = [x for x in tts if x >= min(time_seq) and x <= max(time_seq)]
-        if set(time_seq) == set(sub_tts):
-            # print(f"check_freq_and_market: {freq_x} - {market}")
+        sub_tts = tts[bisect_left(tts, time_seq[0]): bisect_right(tts, time_seq[-1])]
+        if time_seq == sub_tts:
             return freq_x, market
 
     return None, "默认"
@@ -110,7 +144,8 @@ def freq_end_date(dt, freq: Union[Freq, AnyStr]):
     if not isinstance(freq, Freq):
         freq = Freq(freq)
 
-    dt = pd.to_datetime(dt)
+    # dt 已经是 date / datetime，直接构造 Timestamp，比 pd.to_datetime 快一个数量级
+    dt = pd.Timestamp(dt)
     if freq == Freq.D:
         return dt
 
@@ -146,6 +181,9 @@ def freq_end_date(dt, freq: Union[Freq, AnyStr]):
 def freq_end_time(dt: datetime, freq: Union[Freq, AnyStr], market="A股") -> datetime:
     """A股与期货市场精确的获取 dt 对应的K线周期结束时间
 
+    计算结果只与 (dt, freq, market) 有关，使用 lru_cache 缓存，避免重复计算；
+    datetime 与 Timestamp、不同时区的同一时刻会被判定为相等，缓存 key 中额外加入 type(dt) 和 dt.tzinfo 加以区分
+
     :param dt: datetime
     :param freq: Freq
     :return: datetime
@@ -153,16 +191,23 @@ def freq_end_time(dt: datetime, freq: Union[Freq, AnyStr], market="A股") -> dat
     assert market in ['A股', '期货', '默认'], "market 参数必须为 A股 或 期货 或 默认"
     if not isinstance(freq, Freq):
         freq = Freq(freq)
+    if dt is pd.NaT:
+        raise ValueError("dt 不能为 NaT")
+    return _freq_end_time(dt, freq, market, type(dt), dt.tzinfo)
+
+
+@lru_cache(maxsize=200000)
+def _freq_end_time(dt: datetime, freq: Freq, market: str, dt_type: type, tzinfo) -> datetime:
+    """freq_end_time 的缓存实现，freq 必须是 Freq 对象；dt_type 和 tzinfo 仅用于区分缓存 key"""
     if dt.second > 0 or dt.microsecond > 0:
         dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
 
-    hm = dt.strftime("%H:%M")
-    key = f"{freq.value}_{market}"
-    if freq.value.endswith("分钟"):
-        h, m = map(int, freq_edt_map[key][hm].split(":"))
+    if freq in _MINUTE_FREQS:
+        hm = dt.hour * 60 + dt.minute
+        h, m = _freq_edt_minutes[f"{freq.value}_{market}"][hm]
         edt = dt.replace(hour=h, minute=m)
 
-        if h == m == 0 and freq != Freq.F1 and hm != "00:00":
+        if h == m == 0 and freq != Freq.F1 and hm != 0:
             edt += timedelta(days=1)
 
         return edt
@@ -173,6 +218,69 @@ def freq_end_time(dt: datetime, freq: Union[Freq, AnyStr], market="A股") -> dat
     return freq_end_date(dt.date(), freq)
 
 
+_NS_PER_MINUTE = 60 * 10 ** 9
+_NS_PER_DAY = 1440 * _NS_PER_MINUTE
+
+
+@lru_cache(maxsize=None)
+def _freq_edt_lut(freq: Freq, market: str) -> np.ndarray:
+    """分钟周期结束时间查找表：下标为当天的第几分钟，值为结束时间距当天零点的分钟数，不在交易时间内的为 -1
+
+    结束时间为 00:00 的跨日K线（1分钟周期除外），值为 1440，即下一天的零点
+    """
+    lut = np.full(1440, -1, dtype=np.int64)
+    for hm, (h, m) in _freq_edt_minutes[f"{freq.value}_{market}"].items():
+        edt = h * 60 + m
+        if edt == 0 and freq != Freq.F1 and hm != 0:
+            edt = 1440
+        lut[hm] = edt
+    # 查找表被 lru_cache 共享，设为只读防止被意外修改
+    lut.setflags(write=False)
+    return lut
+
+
+def _freq_edt_minute_numpy(dt_ns: np.ndarray, lut: np.ndarray) -> Optional[np.ndarray]:
+    """在 int64 纳秒时间戳上计算分钟周期K线的结束时间
+
+    :param dt_ns: K线时间，int64 纳秒时间戳
+    :param lut: 结束时间查找表，参见 _freq_edt_lut
+    :return: 结束时间，int64 纳秒时间戳；存在不在交易时间内的K线时返回 None
+    """
+    # 秒数不为 0 的时间，向后取整到下一分钟
+    dt_ns = -(-dt_ns // _NS_PER_MINUTE) * _NS_PER_MINUTE
+    day_ns = dt_ns // _NS_PER_DAY * _NS_PER_DAY
+    edt_minutes = lut[(dt_ns - day_ns) // _NS_PER_MINUTE]
+    if (edt_minutes < 0).any():
+        return None
+    return day_ns + edt_minutes * _NS_PER_MINUTE
+
+
+def _minute_freq_edt(dts: pd.Series, freq: Freq, market: str) -> pd.Series:
+    """向量化计算分钟周期K线的结束时间，计算逻辑与 freq_end_time 一致
+
+    注意：不足 1 微秒的纳秒部分也会向后取整到下一分钟，而 freq_end_time 忽略纳秒部分
+
+    :param dts: K线时间序列，datetime64 类型
+    :param freq: 分钟级别的目标周期
+    :param market: 交易市场
+    :return: 每根K线对应的目标周期结束时间
+    """
+    if dts.isna().any():
+        # 存在缺失的时间，交给 freq_end_time 处理（抛出异常）
+        return dts.apply(lambda x: freq_end_time(x, freq, market))
+
+    tz = dts.dt.tz
+    local = dts.dt.tz_localize(None) if tz is not None else dts
+    dt_ns = local.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    edt_ns = _freq_edt_minute_numpy(dt_ns, _freq_edt_lut(freq, market))
+    if edt_ns is None:
+        # 存在不在交易时间段内的时间，交给 freq_end_time 处理（抛出异常）
+        return dts.apply(lambda x: freq_end_time(x, freq, market))
+
+    freq_edt = pd.Series(edt_ns.view("datetime64[ns]"), index=dts.index)
+    return freq_edt.dt.tz_localize(tz) if tz is not None else freq_edt
+
+
 def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=True, **kwargs):
     """将给定的K线数据重新采样为目标周期的K线数据
 
@@ -217,19 +325,20 @@ def resample_bars(df: pd.DataFrame, target_freq: Union[Freq, AnyStr], raw_bars=T
     else:
         market = "默认"
 
-    df['freq_edt'] = df['dt'].apply(lambda x: freq_end_time(x, target_freq, market))
-    dfk1 = df.groupby('freq_edt').agg(
-        {'symbol': 'first', 'dt': 'last', 'open': 'first', 'close': 'last', 'high': 'max',
-         'low': 'min', 'vol': 'sum', 'amount': 'sum', 'freq_edt': 'last'})
-    dfk1.reset_index(drop=True, inplace=True)
-    dfk1['dt'] = dfk1['freq_edt']
+    if target_freq.value.endswith("分钟") and pd.api.types.is_datetime64_any_dtype(df['dt']):
+        df['freq_edt'] = _minute_freq_edt(df['dt'], target_freq, market)
+    else:
+        df['freq_edt'] = df['dt'].apply(lambda x: freq_end_time(x, target_freq, market))
+    # freq_edt 单调递增时（绝大多数情况），跳过 groupby 的排序；期货夜盘跨日时 freq_edt 可能不单调，仍需排序
+    sort = not df['freq_edt'].is_monotonic_increasing
+    dfk1 = df.groupby('freq_edt', sort=sort, as_index=False).agg(
+        {'symbol': 'first', 'open': 'first', 'close': 'last', 'high': 'max',
+         'low': 'min', 'vol': 'sum', 'amount': 'sum'})
+    dfk1 = dfk1.rename(columns={'freq_edt': 'dt'})
     dfk1 = dfk1[['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount']]
 
     if raw_bars:
-        _bars = []
-        for i, row in enumerate(dfk1.to_dict("records"), 1):
-            row.update({'id': i, 'freq': target_freq})
-            _bars.append(RawBar(**row))
+        _bars = _rawbars_from_columns(dfk1, target_freq, range(1, len(dfk1) + 1))
 
         if kwargs.get('drop_unfinished', True):
             # 清除最后一根未完成的K线
@@ -257,14 +366,12 @@ class BarGenerator:
         self.__validate_freqs()
 
     def __validate_freqs(self):
-        from czsc.utils import sorted_freqs
-        if self.base_freq not in sorted_freqs:
+        if self.base_freq not in _SORTED_FREQ_IDX:
             raise ValueError(f'base_freq is not in sorted_freqs: {self.base_freq}')
 
-        i = sorted_freqs.index(self.base_freq)
-        f = sorted_freqs[i:]
+        i = _SORTED_FREQ_IDX[self.base_freq]
         for freq in self.freqs:
-            if freq not in f:
+            if _SORTED_FREQ_IDX.get(freq, -1) < i:
                 raise ValueError(f'freqs中包含不支持的周期：{freq}')
 
     def init_freq_bars(self, freq: str, bars: List[RawBar]):
@@ -305,24 +412,19 @@ class BarGenerator:
         :param freq: 目标周期
         """
         freq_edt = freq_end_time(bar.dt, freq, self.market)
+        bars = self.bars[freq.value]
 
-        if not self.bars[freq.value]:
-            bar_ = RawBar(symbol=bar.symbol, freq=freq, dt=freq_edt, id=0, open=bar.open,
-                          close=bar.close, high=bar.high, low=bar.low, vol=bar.vol, amount=bar.amount)
-            self.bars[freq.value].append(bar_)
+        if not bars or freq_edt != bars[-1].dt:
+            bar_ = RawBar(symbol=bar.symbol, freq=freq, dt=freq_edt, id=bars[-1].id + 1 if bars else 0,
+                          open=bar.open, close=bar.close, high=bar.high, low=bar.low, vol=bar.vol, amount=bar.amount)
+            bars.append(bar_)
             return
 
-        last: RawBar = self.bars[freq.value][-1]
-        if freq_edt != self.bars[freq.value][-1].dt:
-            bar_ = RawBar(symbol=bar.symbol, freq=freq, dt=freq_edt, id=last.id + 1, open=bar.open,
-                          close=bar.close, high=bar.high, low=bar.low, vol=bar.vol, amount=bar.amount)
-            self.bars[freq.value].append(bar_)
-
-        else:
-            bar_ = RawBar(symbol=bar.symbol, freq=freq, dt=freq_edt, id=last.id,
+        # 合并到最后一根K线；必须创建新的 RawBar，保证 cache 中不会残留合并前的计算结果
+        last: RawBar = bars[-1]
+        bars[-1] = RawBar(symbol=bar.symbol, freq=freq, dt=freq_edt, id=last.id,
                           open=last.open, close=bar.close, high=max(last.high, bar.high),
                           low=min(last.low, bar.low), vol=last.vol + bar.vol, amount=last.amount + bar.amount)
-            self.bars[freq.value][-1] = bar_
 
     def update(self, bar: RawBar) -> None:
         """更新各周期K线
@@ -352,7 +454,7 @@ class BarGenerator:
         for freq in self.bars.keys():
             self._update_freq(bar, self.freq_map[freq])
 
-        # 限制存在内存中的K限制数量
-        for f, b in self.bars.items():
+        # 限制存在内存中的K限制数量；原地删除头部元素，避免每次更新都复制整个列表
+        for b in self.bars.values():
             if len(b) > self.max_count:
-                self.bars[f] = b[-self.max_count:]
+                del b[:len(b) - self.max_count]
@@ -277,6 +277,79 @@ def test_freq_end_time():
 
     assert freq_end_time(pd.to_datetime("2021-03-05"), Freq.M) == pd.to_datetime("2021-03-31")
 
+    assert freq_end_time(pd.to_datetime("2021-11-11 09:43"), "5分钟") == pd.to_datetime("2021-11-11 09:45")
+    assert freq_end_time(pd.to_datetime("2021-11-11 09:43:30"), "1分钟") == pd.to_datetime("2021-11-11 09:44")
+
+
+def test_freq_end_time_cache():
+    """相等但类型或时区不同的 dt 不能共用缓存结果"""
+    from datetime import datetime, timezone, timedelta
+
+    # 返回值类型跟随输入类型
+    r1 = freq_end_time(pd.Timestamp("2021-11-11 09:43"), Freq.F5)
+    r2 = freq_end_time(datetime(2021, 11, 11, 9, 43), Freq.F5)
+    assert type(r1) is pd.Timestamp and r1 == pd.Timestamp("2021-11-11 09:45")
+    assert type(r2) is datetime and r2 == datetime(2021, 11, 11, 9, 45)
+
+    # 同一时刻的不同时区按各自的本地时间计算
+    tz8 = timezone(timedelta(hours=8))
+    dt8 = datetime(2021, 11, 11, 9, 43, tzinfo=tz8)
+    assert freq_end_time(dt8, Freq.F5) == datetime(2021, 11, 11, 9, 45, tzinfo=tz8)
+    dt0 = dt8.astimezone(timezone.utc)
+    assert dt0 == dt8
+    try:
+        freq_end_time(dt0, Freq.F5)
+        assert False, "01:43 不是A股交易时间，应当抛出 KeyError"
+    except KeyError:
+        pass
+
+
+def test_minute_freq_edt():
+    """向量化计算的结束时间与逐行调用 freq_end_time 一致"""
+    from czsc.utils.bar_generator import _minute_freq_edt, _freq_edt_lut
+
+    def _check(dts, freq, market):
+        expected = dts.apply(lambda x: freq_end_time(x, freq, market))
+        result = _minute_freq_edt(dts, freq, market)
+        assert result.tolist() == expected.tolist()
+        return result
+
+    # A股：秒数不为 0 时向后取整
+    dts = pd.Series(pd.to_datetime(["2021-11-11 09:31:00", "2021-11-11 09:43:10", "2021-11-11 11:29:59", "2021-11-11 14:59:00"]))
+    for freq in [Freq.F1, Freq.F5, Freq.F15, Freq.F30, Freq.F60]:
+        _check(dts, freq, "A股")
+
+    # 期货夜盘：结束时间为下一天的 00:00
+    dts = pd.Series(pd.to_datetime(["2021-11-11 21:01:00", "2021-11-11 22:30:30", "2021-11-11 23:45:00", "2021-11-12 00:30:00"]))
+    for freq in [Freq.F5, Freq.F30, Freq.F60, Freq.F120]:
+        result = _check(dts, freq, "期货")
+        if freq in [Freq.F30, Freq.F60]:
+            assert result.iloc[2] == pd.Timestamp("2021-11-12 00:00:00")
+
+    # 带时区的时间按本地时间计算，并保留时区
+    dts = pd.Series(pd.to_datetime(["2021-11-11 09:43:00", "2021-11-11 13:01:30"])).dt.tz_localize("Asia/Shanghai")
+    result = _check(dts, Freq.F5, "A股")
+    assert str(result.dt.tz) == "Asia/Shanghai"
+
+    # 不在交易时间内的K线回退到 freq_end_time，抛出 KeyError
+    dts = pd.Series(pd.to_datetime(["2021-11-11 09:43:00", "2021-11-11 03:43:00"]))
+    try:
+        _minute_freq_edt(dts, Freq.F5, "A股")
+        assert False, "03:43 不是A股交易时间，应当抛出 KeyError"
+    except KeyError:
+        pass
+
+    # 存在 NaT 时回退到 freq_end_time，抛出异常而不是生成错误的结束时间
+    dts = pd.Series(pd.to_datetime([None, "2021-11-11 09:43:00"]))
+    for market in ["A股", "期货", "默认"]:
+        try:
+            _minute_freq_edt(dts, Freq.F30, market)
+            assert False, "存在 NaT 时应当抛出异常"
+        except ValueError:
+            pass
+
+    assert not _freq_edt_lut(Freq.F5, "A股").flags.writeable
+
 
 def test_resample_bars():
     df = pd.DataFrame(kline)
@@ -327,6 +400,18 @@ def test_bg_on_f1():
             assert len(bg.bars[freq]) == l
 
 
+def test_bg_validate_freqs():
+    import pytest
+
+    BarGenerator(base_freq='1分钟', freqs=['日线', '5分钟'])
+    with pytest.raises(ValueError):
+        BarGenerator(base_freq='日线', freqs=['30分钟'])
+    with pytest.raises(ValueError):
+        BarGenerator(base_freq='1分钟', freqs=['abc'])
+    with pytest.raises(ValueError):
+        BarGenerator(base_freq='abc', freqs=['日线'])
+
+
 def test_bg_on_d():
     bars = read_daily()
     bg = BarGenerator(base_freq='日线', freqs=['周线', '月线', '季线', '年线'], max_count=2000)
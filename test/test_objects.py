@@ -1,6 +1,7 @@
 # coding: utf-8
 import numpy as np
 from collections import OrderedDict
+from unittest.mock import patch
 from czsc.utils import x_round
 from czsc.objects import Signal, Factor, Event, Freq, Operate
 from czsc.objects import cal_break_even_point
@@ -28,6 +29,26 @@ def test_raw_bar():
     assert np.array([x.cache[key] for x in bars]).sum() == ma.sum() + 200
 
 
+def test_slots_unpickle_old_state():
+    """旧版本保存的 NewBar/FX 状态为 __dict__ 字典，反序列化时应当兼容"""
+    import pickle
+    from datetime import datetime
+    from czsc.enum import Mark
+    from czsc.objects import NewBar, FX
+
+    state = dict(symbol='x', id=1, dt=datetime(2021, 1, 1), freq=Freq.D, open=1, close=2,
+                 high=3, low=0.5, vol=10, amount=100, elements=[], cache={})
+    nb = NewBar.__new__(NewBar)
+    nb.__setstate__(state)
+    assert nb == NewBar(**state)
+
+    fx = FX.__new__(FX)
+    fx.__setstate__(dict(symbol='x', dt=datetime(2021, 1, 1), mark=Mark.G, high=3, low=0.5, fx=3,
+                         elements=[nb], cache={}))
+    assert fx.new_bars == [nb]
+    assert pickle.loads(pickle.dumps(fx)) == fx
+
+
 def test_zs():
     """测试中枢对象"""
     from test.test_analyze import read_daily
@@ -66,6 +87,9 @@ def test_signal():
     assert s.is_match({"1分钟_倒1形态": "类一买_七笔_基础型_3"})
     assert not s.is_match({"1分钟_倒1形态": "类一买_七笔_特例一_3"})
     assert not s.is_match({"1分钟_倒1形态": "类一买_九笔_基础型_3"})
+    assert Signal._parse('1分钟_任意_倒1形态_类一买_七笔_基础型_3') == (
+        '1分钟', '任意', '倒1形态', '类一买', '七笔', '基础型', 3)
+    assert Signal('1分钟_任意_倒1形态_类一买_七笔_基础型_3').score == 3
 
     s = Signal(k1="1分钟", k2="倒1形态", k3="类一买", score=3)
     assert str(s) == "Signal('1分钟_倒1形态_类一买_任意_任意_任意_3')"
@@ -77,6 +101,19 @@ def test_signal():
         assert str(e) == 'score 必须在0~100之间'
 
 
+def test_signal_unpickle_old_state():
+    """旧版本保存的 Signal 没有预先计算的匹配属性，反序列化后应当能正常使用"""
+    import pickle
+
+    s = Signal('1分钟_任意_倒1形态_类一买_七笔_基础型_3')
+    for attr in ['_key', '_pattern', '_wild']:
+        delattr(s, attr)
+    s = pickle.loads(pickle.dumps(s))
+    assert s.key == "1分钟_倒1形态"
+    assert s.is_match({"1分钟_倒1形态": "类一买_七笔_基础型_3"})
+    assert not s.is_match({"1分钟_倒1形态": "类一买_九笔_基础型_3"})
+
+
 def test_factor():
     freq = Freq.F15
     s = OrderedDict()
@@ -211,6 +248,20 @@ def test_event():
     m, f = event.is_match(s)
     assert not m and not f
 
+    # 多个因子共用相同信号时，匹配结果与逐个因子判断一致
+    shared = Signal('15分钟_倒0笔_长度_大于5_其他_其他_0')
+    event = Event(name="单测", operate=Operate.LO, factors=[
+        Factor(name="A", signals_all=[shared, Signal('15分钟_倒0笔_方向_向下_其他_其他_0')]),
+        Factor(name="B", signals_all=[shared, Signal('15分钟_倒0笔_方向_向上_其他_其他_0')]),
+    ])
+    m, f = event.is_match(s)
+    assert m and f.startswith("B#")
+
+    # 共用的信号在一次 Event.is_match 中只匹配一次
+    with patch.object(Signal, 'is_match', autospec=True, side_effect=Signal.is_match) as mock_match:
+        assert event.is_match(s) == (m, f)
+        assert [c.args[0].signal for c in mock_match.call_args_list].count(shared.signal) == 1
+
     event = Event(name="单测", operate=Operate.LO, factors=[
         Factor(
             name="测试",
@@ -278,3 +329,48 @@ def test_event():
         }
     )
     assert len(event.get_signals_config()) == 3
+
+
+def test_is_match_batch():
+    import pandas as pd
+
+    rows = []
+    for v1 in ["向上", "向下"]:
+        for v2 in ["大于5", "小于5"]:
+            for score in [0, 50]:
+                rows.append({
+                    "15分钟_倒0笔_方向": f"{v1}_其他_其他_{score}",
+                    "15分钟_倒0笔_长度": f"{v2}_其他_其他_0",
+                })
+    df = pd.DataFrame(rows)
+
+    signal = Signal('15分钟_倒0笔_方向_向上_任意_任意_10')
+    assert signal.is_match_batch(df).tolist() == df.apply(signal.is_match, axis=1).tolist()
+
+    factor = Factor(
+        signals_all=[Signal('15分钟_倒0笔_方向_向上_其他_其他_0')],
+        signals_any=[Signal('15分钟_倒0笔_长度_大于5_其他_其他_0'), Signal('15分钟_倒0笔_方向_任意_任意_任意_50')],
+        signals_not=[Signal('15分钟_倒0笔_长度_小于5_其他_其他_0')],
+    )
+    assert factor.is_match_batch(df).tolist() == df.apply(factor.is_match, axis=1).tolist()
+
+    event = Event(operate=Operate.LO, factors=[
+        Factor(name="A", signals_all=[Signal('15分钟_倒0笔_长度_小于5_其他_其他_0')]),
+        Factor(name="B", signals_all=[Signal('15分钟_倒0笔_方向_向上_其他_其他_0')]),
+    ], signals_not=[Signal('15分钟_倒0笔_方向_向下_其他_其他_50')])
+    mask, factors = event.is_match_batch(df)
+    expected = df.apply(event.is_match, axis=1).tolist()
+    assert list(zip(mask.tolist(), factors.tolist())) == expected
+
+    # signals_any / signals_not 为 None 时与 is_match 一致
+    factor = Factor(signals_all=[Signal('15分钟_倒0笔_方向_向上_其他_其他_0')], signals_any=None, signals_not=None)
+    assert factor.is_match_batch(df).tolist() == df.apply(factor.is_match, axis=1).tolist()
+    event = Event(operate=Operate.LO, factors=[factor], signals_all=None, signals_any=None, signals_not=None)
+    mask, factors = event.is_match_batch(df)
+    assert list(zip(mask.tolist(), factors.tolist())) == df.apply(event.is_match, axis=1).tolist()
+
+    try:
+        Signal('15分钟_倒1笔_方向_向上_任意_任意_0').is_match_batch(df)
+        assert False
+    except ValueError as e:
+        assert "不在信号列表中" in str(e)
@@ -7,6 +7,7 @@ create_dt: 2021/11/7 21:07
 import os
 import pandas as pd
 from copy import deepcopy
+from unittest.mock import patch
 from czsc.utils.cache import home_path
 from czsc.traders.base import CzscSignals, BarGenerator, CzscTrader
 from czsc.traders.sig_parse import get_signals_config, get_signals_freqs
@@ -89,6 +90,43 @@ def test_object_position():
     assert len(cs.s) == 13
 
 
+def test_position_shared_signal_cache():
+    """开平仓事件共用信号时，Position.update 每根K线只匹配一次共用信号，且开平仓操作不变"""
+    shared = Signal("日线_D1_共用_满足_任意_任意_0")
+    opens = [Event(name='开多', operate=Operate.LO, factors=[
+        Factor(name="A", signals_all=[shared, Signal("日线_D1_开仓_满足_任意_任意_0")])
+    ])]
+    exits = [Event(name='平多', operate=Operate.LE, factors=[
+        Factor(name="B", signals_all=[shared, Signal("日线_D1_平仓_满足_任意_任意_0")])
+    ])]
+
+    seq = []
+    for i, dt in enumerate(pd.date_range("2023-01-02", periods=60, freq="D")):
+        seq.append({"symbol": "000001.SH", "dt": dt, "id": i, "close": 10 + i % 7,
+                    "日线_D1_共用": "满足_任意_任意_0" if i % 3 else "其他_任意_任意_0",
+                    "日线_D1_开仓": "满足_任意_任意_0" if i % 5 == 1 else "其他_任意_任意_0",
+                    "日线_D1_平仓": "满足_任意_任意_0" if i % 4 == 2 else "其他_任意_任意_0"})
+
+    pos = Position(name="共用信号", symbol="000001.SH", opens=opens, exits=exits, interval=0, timeout=20)
+    ref = deepcopy(pos)
+
+    # 参照：每个事件单独匹配，不共用缓存
+    _is_match_cached = Event._is_match_cached
+    with patch.object(Event, '_is_match_cached', autospec=True,
+                      side_effect=lambda self, s, cache: _is_match_cached(self, s, {})):
+        for s in seq:
+            ref.update(s)
+
+    with patch.object(Signal, 'is_match', autospec=True, side_effect=Signal.is_match) as mock_match:
+        for s in seq:
+            mock_match.reset_mock()
+            pos.update(s)
+            assert [c.args[0].signal for c in mock_match.call_args_list].count(shared.signal) == 1
+
+    assert pos.operates and pos.operates == ref.operates
+    assert {x['op'] for x in pos.operates} == {Operate.LO, Operate.LE}
+
+
 def test_generate_czsc_signals():
     from czsc.traders.base import generate_czsc_signals
 